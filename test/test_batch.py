@@ -0,0 +1,95 @@
+
+import shutil
+import simplejson
+
+from wsgiref.util import setup_testing_defaults
+
+from tiddlyweb.config import config
+from tiddlyweb.model.bag import Bag
+from tiddlyweb.model.tiddler import Tiddler
+from tiddlyweb.web.serve import load_app
+
+from tiddlywebplugins.whoosher import init, search, search_many
+
+from tiddlywebplugins.utils import get_store
+
+
+def setup_module(module):
+    try:
+        shutil.rmtree('store')
+    except:
+        pass
+    try:
+        shutil.rmtree('indexdir')
+    except:
+        pass
+
+    init(config)
+    module.store = get_store(config)
+    module.store.put(Bag('batched'))
+
+
+def test_search_many():
+    tiddler = Tiddler('first', 'batched')
+    tiddler.text = 'alpha'
+    tiddler.tags = ['shared']
+    store.put(tiddler)
+
+    tiddler = Tiddler('second', 'batched')
+    tiddler.text = 'beta'
+    tiddler.tags = ['shared']
+    store.put(tiddler)
+
+    queries = ['alpha', 'tag:shared', 'gamma']
+    all_results = search_many(config, queries)
+
+    assert len(all_results) == 3
+    for query, results in zip(queries, all_results):
+        assert ([result['id'] for result in results]
+                == [result['id'] for result in search(config, query)])
+    assert len(all_results[1]) == 2
+    assert len(all_results[2]) == 0
+
+
+def _get(query_string):
+    environ = {'PATH_INFO': '/search/batch', 'QUERY_STRING': query_string}
+    setup_testing_defaults(environ)
+    statuses = []
+    app = load_app()
+    output = app(environ, lambda status, headers, *args:
+            statuses.append(status))
+    return statuses[0], b''.join(output)
+
+
+def test_batch_web():
+    bag = Bag('private')
+    bag.policy.read = ['someoneelse']
+    store.put(bag)
+    tiddler = Tiddler('hidden', 'private')
+    tiddler.text = 'alpha'
+    store.put(tiddler)
+
+    status, output = _get('q=alpha&q=tag:shared')
+    assert status.startswith('200')
+    info = simplejson.loads(output.decode('UTF-8'))
+    assert [result['query'] for result in info] == ['alpha', 'tag:shared']
+    assert info[0]['tiddlers'] == [{'bag': 'batched', 'title': 'first'}]
+    assert sorted(tiddler['title'] for tiddler in info[1]['tiddlers']) == [
+            'first', 'second']
+
+
+def test_batch_web_no_query():
+    status, output = _get('')
+    assert status.startswith('400')
+
+
+def test_batch_web_limit():
+    config['wsearch.batch_limit'] = 2
+    try:
+        status, output = _get('q=alpha&q=beta')
+        assert status.startswith('200')
+        status, output = _get('q=alpha&q=beta&q=gamma')
+        assert status.startswith('400')
+        assert b'too many queries' in output
+    finally:
+        del config['wsearch.batch_limit']
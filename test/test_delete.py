@@ -1,11 +1,17 @@
 
+import os
 import shutil
 
+from whoosh.fields import Schema
+from whoosh.index import create_in
+
 from tiddlyweb.config import config
 from tiddlyweb.model.bag import Bag
 from tiddlyweb.model.tiddler import Tiddler
+from tiddlyweb.manage import COMMANDS
 
-from tiddlywebplugins.whoosher import init, search
+from tiddlywebplugins.whoosher import (init, search, index_bag,
+        SEARCH_DEFAULTS)
 
 from tiddlywebplugins.utils import get_store
 
@@ -57,3 +63,86 @@ def test_search_unique():
 
     tiddlers = list(search(config, 'housesdogscats'))
     assert len(tiddlers) == 0
+
+
+def test_delete_bag():
+    bag = Bag('bag2')
+    store.put(bag)
+    for title in ['one', 'two']:
+        tiddler = Tiddler(title, 'bag2')
+        tiddler.text = 'bagdeletedword'
+        store.put(tiddler)
+
+    tiddlers = list(search(config, 'bagdeletedword'))
+    assert len(tiddlers) == 2
+
+    store.delete(bag)
+
+    tiddlers = list(search(config, 'bagdeletedword'))
+    assert len(tiddlers) == 0
+
+
+def test_rename_bag():
+    store.put(Bag('bag3'))
+    tiddler = Tiddler('moving', 'bag3')
+    tiddler.text = 'bagrenamedword'
+    store.put(tiddler)
+
+    # simulate a rename done directly in the store, without hooks
+    store.put(Bag('bag4'))
+    tiddler.bag = 'bag4'
+    store.storage.tiddler_put(tiddler)
+
+    index_bag(config, store, store.get(Bag('bag4')), old_name='bag3')
+
+    tiddlers = list(search(config, 'bagrenamedword'))
+    assert len(tiddlers) == 1
+    assert tiddlers[0]['id'] == 'bag4:moving'
+
+
+def test_delete_bag_exact():
+    for bag_name in ['a', 'a:b']:
+        store.put(Bag(bag_name))
+        tiddler = Tiddler('x', bag_name)
+        tiddler.text = 'exactbagword'
+        store.put(tiddler)
+    tiddler = Tiddler('b:y', 'a')
+    tiddler.text = 'exactbagword'
+    store.put(tiddler)
+
+    tiddlers = list(search(config, 'exactbagword'))
+    assert len(tiddlers) == 3
+
+    store.delete(Bag('a'))
+
+    tiddlers = list(search(config, 'exactbagword'))
+    assert [tiddler['id'] for tiddler in tiddlers] == ['a:b:x']
+
+
+def test_rename_missing_bag(capsys):
+    COMMANDS['wrenamebag'](['bag3', 'nosuchbag'])
+    output, _ = capsys.readouterr()
+    assert 'no such bag: nosuchbag' in output
+
+
+def test_index_without_bagid(caplog):
+    shutil.rmtree('indexdir')
+    os.mkdir('indexdir')
+    old_schema = dict(SEARCH_DEFAULTS['wsearch.schema'])
+    del old_schema['bagid']
+    create_in('indexdir', Schema(**old_schema))
+
+    store.put(Bag('oldbag'))
+    tiddler = Tiddler('old', 'oldbag')
+    tiddler.text = 'oldschemaword'
+    store.put(tiddler)
+
+    tiddlers = list(search(config, 'oldschemaword'))
+    assert len(tiddlers) == 1
+
+    index_bag(config, store, store.get(Bag('oldbag')))
+    tiddlers = list(search(config, 'oldschemaword'))
+    assert len(tiddlers) == 1
+
+    store.delete(Bag('oldbag'))
+    assert 'index has no bagid field' in caplog.text
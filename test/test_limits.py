@@ -0,0 +1,53 @@
+
+import shutil
+
+from tiddlyweb.config import config
+from tiddlyweb.model.bag import Bag
+from tiddlyweb.model.tiddler import Tiddler
+
+from tiddlywebplugins.whoosher import init, search, INDEX_STATS
+
+from tiddlywebplugins.utils import get_store
+
+
+def setup_module(module):
+    try:
+        shutil.rmtree('store')
+    except:
+        pass
+    try:
+        shutil.rmtree('indexdir')
+    except:
+        pass
+
+    init(config)
+    config['wsearch.field_limits'] = {'text': 20}
+    module.store = get_store(config)
+    module.store.put(Bag('limited'))
+
+
+def teardown_module(module):
+    del config['wsearch.field_limits']
+
+
+def test_truncated_text():
+    truncated = INDEX_STATS['truncated']
+    tiddler = Tiddler('long', 'limited')
+    tiddler.text = 'shortwords ' + 'filler ' * 100 + 'farawayword'
+    store.put(tiddler)
+
+    assert INDEX_STATS['truncated'] > truncated
+    assert len(list(search(config, 'shortwords'))) == 1
+    assert len(list(search(config, 'farawayword'))) == 0
+
+
+def test_binaryish_text():
+    skipped = INDEX_STATS['skipped']
+    tiddler = Tiddler('binaryish', 'limited')
+    tiddler.text = 'nulword\x00 nulword'
+    tiddler.tags = ['nulled']
+    store.put(tiddler)
+
+    assert INDEX_STATS['skipped'] > skipped
+    assert len(list(search(config, 'nulword'))) == 0
+    assert len(list(search(config, 'tag:nulled'))) == 1
@@ -0,0 +1,93 @@
+
+import shutil
+
+import pytest
+
+from httpexceptor import HTTP400
+
+from tiddlyweb.config import config
+from tiddlyweb.model.bag import Bag
+from tiddlyweb.model.tiddler import Tiddler
+
+from tiddlyweb.manage import COMMANDS
+
+from tiddlywebplugins.whoosher import (init, search, get_searcher,
+        get_schema, whoosh_search)
+
+from tiddlywebplugins.utils import get_store
+
+
+def setup_module(module):
+    try:
+        shutil.rmtree('store')
+    except:
+        pass
+    try:
+        shutil.rmtree('indexdir')
+    except:
+        pass
+
+    init(config)
+    config['wsearch.profile'] = 'compact'
+    module.store = get_store(config)
+    module.store.put(Bag('small'))
+
+
+def teardown_module(module):
+    del config['wsearch.profile']
+    shutil.rmtree('indexdir')
+
+
+def test_compact_profile():
+    tiddler = Tiddler('compact', 'small')
+    tiddler.text = 'little words'
+    tiddler.tags = ['tiny']
+    store.put(tiddler)
+
+    tiddlers = list(search(config, 'little'))
+    assert len(tiddlers) == 1
+    assert tiddlers[0]['id'] == 'small:compact'
+    assert len(list(search(config, 'tag:tiny'))) == 1
+
+    searcher = get_searcher(config)
+    assert list(searcher.documents()) == [{'id': 'small:compact'}]
+    assert not searcher.schema['text'].format.supports('positions')
+
+
+def test_compact_wstats(capsys):
+    # merge away documents deleted by repeated indexing hooks
+    COMMANDS['woptimize']([])
+    COMMANDS['wstats']([])
+    output, _ = capsys.readouterr()
+    lines = output.splitlines()
+    assert lines[0].startswith('documents: 1 bytes: ')
+    assert ('text: format=Frequency stored=False column=False terms=2 '
+            'postings=2 tokens=2') in lines
+    assert ('id: format=Existence stored=True column=False terms=1 '
+            'postings=1 tokens=0') in lines
+
+
+def test_compact_phrase_query():
+    environ = {'tiddlyweb.config': config,
+            'tiddlyweb.query': {'q': ['"little words"']}}
+    pytest.raises(HTTP400, whoosh_search, environ)
+
+
+def test_compact_wtags(capsys):
+    tiddler = Tiddler('doomed', 'small')
+    tiddler.tags = ['gone']
+    store.put(tiddler)
+    store.delete(tiddler)
+
+    COMMANDS['wtags']([])
+    output, _ = capsys.readouterr()
+    assert 'tiny' in output
+    assert 'gone' not in output
+
+
+def test_unknown_profile():
+    config['wsearch.profile'] = 'missing'
+    try:
+        pytest.raises(ValueError, get_schema, config)
+    finally:
+        config['wsearch.profile'] = 'compact'
@@ -0,0 +1,108 @@
+
+import os
+import shutil
+import time
+
+from wsgiref.util import setup_testing_defaults
+
+from tiddlyweb.config import config
+from tiddlyweb.model.bag import Bag
+from tiddlyweb.model.tiddler import Tiddler
+from tiddlyweb.web.serve import load_app
+
+from tiddlywebplugins import whoosher
+from tiddlywebplugins.whoosher import (init, warm_up, whoosher_ready,
+        READINESS)
+
+from tiddlywebplugins.utils import get_store
+
+
+def setup_module(module):
+    try:
+        shutil.rmtree('store')
+    except:
+        pass
+    try:
+        shutil.rmtree('indexdir')
+    except:
+        pass
+
+    init(config)
+    module.store = get_store(config)
+    module.store.put(Bag('warm'))
+
+
+def teardown_module(module):
+    config.pop('wsearch.warmup', None)
+
+
+def _status():
+    statuses = []
+    whoosher_ready({'tiddlyweb.config': config},
+            lambda status, headers: statuses.append(status))
+    return statuses[0]
+
+
+def test_warm_up():
+    tiddler = Tiddler('toasty', 'warm')
+    tiddler.text = 'heat'
+    store.put(tiddler)
+
+    READINESS['ready'] = False
+    assert _status().startswith('503')
+
+    warm_up(config, ['heat', 'tag:hot'])
+
+    assert READINESS['ready']
+    assert _status().startswith('200')
+
+
+def test_warm_up_error(monkeypatch, caplog):
+    def broken_search_many(config, queries):
+        raise ValueError('broken index')
+    monkeypatch.setattr(whoosher, 'search_many', broken_search_many)
+
+    READINESS['ready'] = False
+    warm_up(config, ['heat'])
+
+    assert READINESS['ready']
+    assert 'broken index' in caplog.text
+
+
+def _get_ready(app):
+    environ = {'PATH_INFO': '/search/ready'}
+    setup_testing_defaults(environ)
+    statuses = []
+    app(environ, lambda status, headers, *args: statuses.append(status))
+    return statuses[0]
+
+
+def _wait_ready():
+    for _ in range(50):
+        if READINESS['ready']:
+            return
+        time.sleep(.1)
+
+
+def test_init_starts_warm_up():
+    config['wsearch.warmup'] = ['heat']
+    READINESS.update(ready=True, pid=None)
+
+    app = load_app()
+
+    assert READINESS['pid'] == os.getpid()
+    _wait_ready()
+    assert _get_ready(app).startswith('200')
+
+
+def test_forked_worker_warm_up():
+    config['wsearch.warmup'] = ['heat']
+    app = load_app()
+    # the state a worker forked from a warming up parent inherits
+    READINESS.update(ready=False, pid=-1)
+
+    _get_ready(app)
+
+    assert READINESS['pid'] == os.getpid()
+    _wait_ready()
+    assert _get_ready(app).startswith('200')
@@ -17,10 +17,42 @@ indexed do not start with prefix, they will not be indexed. For
 example 'twanager wreindex a' will index all tiddlers whose
 title starts with 'a' (case sensitive!).
 
+Deleting a bag removes all its tiddlers from the index, also when
+beanstalk listeners do the tiddler indexing. This uses the exact bag
+name kept in the 'bagid' field, which is in the default schema and
+the profiles. A custom wsearch.schema must include
+
+        'bagid': ID,
+
+for bag deletes to work. Indexes made before the field was added to
+the schema keep working for tiddlers, but bag deletes only log an
+error until the index directory is removed and rebuilt with 'twanager
+wreindex'. If a bag has been renamed underneath TiddlyWeb, 'twanager
+wrenamebag <old> <new>' moves its entries in the index in one commit.
+
 Over time the index files will be get lumpy. To optimize them,
 you may run 'twanager woptimize'. This will lock the index so it
 is best to do while the instance server is off.
 
+Several searches can be made in one request with
+/search/batch?q=<query>&q=<query>, which runs every query against
+the same searcher and returns a JSON list of the bag and title of
+the readable tiddlers found for each query. search_many is the
+equivalent Python API. At most wsearch.batch_limit (default 20)
+queries are accepted in one request.
+
+The first searches made by a fresh server process are slow while
+index files are read from disk and analyzer caches are filled. Setting
+wsearch.warmup to a list of representative queries makes each web
+server process run those queries in a background thread, which fills
+the operating system's page cache and the analyzer caches used when
+parsing queries. The warm-up starts when the plugin is loaded, or in
+a process forked after that (for example by a preforking server that
+loads the application first), on its first request to /search,
+/search/batch or /search/ready. Until the warm-up is done
+/search/ready responds with 503, and 200 after, so a load balancer
+can wait for it.
+
 By default the index is located in a directory called 'indexdir'
 off the main instance directory. This may be changed by setting
 
@@ -34,6 +66,32 @@ That default does not index fields. If there are tiddlers fields that need
 to be indexed for a particular installation or application, wsearch.schema
 and wsearch.default_fields can be set. _Read the code_ to understand how
 these can be used.
+
+Instead of a full schema, wsearch.profile may name one of the schemas
+in SEARCH_PROFILES. The 'phrase' profile is the default schema, which
+records term positions so phrase queries work. The 'compact' profile
+records only term frequencies and stores nothing but the tiddler id,
+making for a smaller index which is cheaper to cache, at the cost of
+phrase ("quoted") queries. Changing the profile of an existing index
+requires removing the index directory and running 'twanager wreindex'.
+'twanager wstats' reports how much of the index each field uses.
+Neither profile declares column (sortable) fields, as whoosher does
+not sort on fields. A custom wsearch.schema may, and wstats shows
+which fields are columns.
+
+Very large field values (logs, pasted data) can be capped per field by
+setting wsearch.field_limits to a dict of schema field names and a
+maximum number of characters to index:
+
+        'wsearch.field_limits': {'text': 100000},
+
+Values beyond the limit are truncated before being analyzed, and
+values which look binary (they contain NUL characters near the start)
+are not indexed at all. The number of documents truncated and the
+number with skipped fields are counted per process in INDEX_STATS.
+Each time a document is limited the running totals are logged at
+INFO level, so the web server and listeners report them in their
+logs, and 'twanager wreindex' prints the totals when it is done.
 """
 
 from __future__ import print_function
@@ -41,6 +99,8 @@ from __future__ import print_function
 import os
 
 import logging
+import simplejson
+import threading
 import time
 
 from httpexceptor import HTTP400
@@ -50,6 +110,7 @@ from whoosh.index import exists_in, create_in, open_dir
 from whoosh.fields import Schema, ID, KEYWORD, TEXT
 from whoosh.analysis import StemmingAnalyzer
 from whoosh.qparser import FieldAliasPlugin
+from whoosh.query import QueryError
 
 
 from whoosh.qparser import MultifieldParser
@@ -63,12 +124,13 @@ from tiddlywebplugins.utils import get_store, replace_handler
 
 from tiddlyweb.manage import make_command
 from tiddlyweb.util import binary_tiddler
-from tiddlyweb.store import (NoTiddlerError, StoreMethodNotImplemented,
-        StoreError, HOOKS)
+from tiddlyweb.store import (NoBagError, NoTiddlerError,
+        StoreMethodNotImplemented, StoreError, HOOKS)
 
 from tiddlyweb.web.handler.search import get_search_query
 from tiddlyweb.web.sendtiddlers import send_tiddlers
 
+from tiddlyweb.model.bag import Bag
 from tiddlyweb.model.tiddler import Tiddler
 from tiddlyweb.model.collections import Tiddlers
 
@@ -82,6 +144,8 @@ SEARCH_DEFAULTS = {
         'wsearch.schema': {
             'title': TEXT(field_boost=1.75),
             'id': ID(stored=True, unique=True),
+            # the exact bag name, for removing all of a bag's tiddlers
+            'bagid': ID,
             'bag': KEYWORD(stored=True),
             'text': TEXT(analyzer=StemmingAnalyzer()),
             'modified': ID,
@@ -93,24 +157,70 @@ SEARCH_DEFAULTS = {
                 commas=True, scorable=True,
                 lowercase=True),
         },
+        'wsearch.profile': None,
         'wsearch.indexdir': 'indexdir',
         'wsearch.default_fields': ['title', 'tags', 'text'],
+        'wsearch.field_limits': {},
+        'wsearch.warmup': None,
+        'wsearch.batch_limit': 20,
+}
+
+SEARCH_PROFILES = {
+        'phrase': SEARCH_DEFAULTS['wsearch.schema'],
+        'compact': {
+            'title': TEXT(field_boost=1.75, phrase=False),
+            'id': ID(stored=True, unique=True),
+            'bagid': ID,
+            'bag': KEYWORD,
+            'text': TEXT(analyzer=StemmingAnalyzer(), phrase=False),
+            'modified': ID,
+            'modifier': ID,
+            'created': ID,
+            'creator': ID,
+            'tags': KEYWORD(field_boost=1.5, commas=True, scorable=True,
+                lowercase=True),
+        },
 }
 
+# How many leading characters of a value are inspected when
+# deciding if it looks binary.
+BINARY_SAMPLE = 1024
+
+# Counts of documents modified by field limits while indexing
+# in this process.
+INDEX_STATS = {'truncated': 0, 'skipped': 0}
+
+# Whether this process has finished warming up the index,
+# and the process id of the process that started warming up.
+READINESS = {'ready': True, 'pid': None}
+WARMUP_LOCK = threading.Lock()
+
 
 def init(config):
     if __name__ not in config.get('beanstalk.listeners', []):
         # tiddler_change handles both put and deleted tiddlers
         HOOKS['tiddler']['put'].append(_tiddler_change_handler)
         HOOKS['tiddler']['delete'].append(_tiddler_change_handler)
+    # listeners only handle tiddlers, so bag deletes are always hooked
+    HOOKS['bag']['delete'].append(_bag_delete_handler)
 
     @make_command()
     def wtags(args):
         """List tags used in index."""
         searcher = get_searcher(config)
         set_tags = set()
-        for stored_fields in searcher.documents():
-            set_tags.update(stored_fields['tags'].split(','))
+        try:
+            if searcher.schema['tags'].stored:
+                for stored_fields in searcher.documents():
+                    set_tags.update(stored_fields['tags'].split(','))
+            else:
+                # postings exclude deleted documents, the lexicon does not
+                reader = searcher.reader()
+                for tag in reader.field_terms('tags'):
+                    if reader.postings('tags', tag).is_active():
+                        set_tags.add(tag)
+        finally:
+            searcher.close()
         print('tags: %s' % ', '.join(set_tags))
 
     @make_command()
@@ -129,34 +239,30 @@ def init(config):
             prefix = args[0]
         except IndexError:
             prefix = None
-        store = get_store(config)
-        schema = config.get('wsearch.schema',
-                SEARCH_DEFAULTS['wsearch.schema'])
         if __name__ in config.get('beanstalk.listeners', []):
             _reindex_async(config)
         else:
+            store = get_store(config)
             for bag in store.list_bags():
-                bag = store.get(bag)
-                writer = get_writer(config)
-                if writer:
-                    try:
-                        try:
-                            tiddlers = bag.get_tiddlers()
-                        except AttributeError:
-                            tiddlers = store.list_bag_tiddlers(bag)
-                        for tiddler in tiddlers:
-                            if prefix and not tiddler.title.startswith(prefix):
-                                continue
-                            tiddler = store.get(tiddler)
-                            index_tiddler(tiddler, schema, writer)
-                        writer.commit()
-                    except:
-                        LOGGER.debug('whoosher: exception while indexing: %s',
-                                format_exc())
-                        writer.cancel()
-                else:
-                    LOGGER.debug('whoosher: unable to get writer '
-                            '(locked) for %s', bag.name)
+                index_bag(config, store, store.get(bag), prefix=prefix)
+            print('truncated: %s skipped: %s' % (INDEX_STATS['truncated'],
+                INDEX_STATS['skipped']))
+
+    @make_command()
+    def wrenamebag(args):
+        """Move the index entries of a renamed bag: <old name> <new name>"""
+        try:
+            old_name, new_name = args[0:2]
+        except ValueError:
+            print('usage: twanager wrenamebag <old name> <new name>')
+            return
+        store = get_store(config)
+        try:
+            bag = store.get(Bag(new_name))
+        except NoBagError:
+            print('no such bag: %s' % new_name)
+            return
+        index_bag(config, store, bag, old_name=old_name)
 
     @make_command()
     def woptimize(args):
@@ -164,17 +270,46 @@ def init(config):
         index = get_index(config)
         index.optimize()
 
+    @make_command()
+    def wstats(args):
+        """Report the size of the index and how much each field uses."""
+        index = get_index(config)
+        index_dir = _index_dir(config)
+        size = sum(os.path.getsize(os.path.join(index_dir, filename))
+                for filename in os.listdir(index_dir))
+        print('documents: %s bytes: %s' % (index.doc_count(), size))
+        reader = index.reader()
+        try:
+            for name, field in sorted(index.schema.items()):
+                terms = postings = 0
+                for term in reader.lexicon(name):
+                    terms += 1
+                    postings += reader.doc_frequency(name, term)
+                print('%s: format=%s stored=%s column=%s terms=%s '
+                        'postings=%s tokens=%s' % (name,
+                            field.format.__class__.__name__, field.stored,
+                            getattr(field, 'column_type', None) is not None,
+                            terms, postings, reader.field_length(name)))
+        finally:
+            reader.close()
+
     if 'selector' in config:
         handler = config.get('wsearch.handler')
         if handler:
             config['selector'].add('/%s[.{format}]' % handler,
                     GET=whoosher_search)
         else:
+            handler = 'search'
             replace_handler(config['selector'], '/search',
                     dict(GET=whoosher_search))
+        config['selector'].add('/%s/batch' % handler,
+                GET=whoosher_batch_search)
+        config['selector'].add('/%s/ready' % handler, GET=whoosher_ready)
+        start_warm_up(config)
 
 
 def whoosher_search(environ, start_response):
+    start_warm_up(environ['tiddlyweb.config'])
     store = environ['tiddlyweb.store']
     filters = environ['tiddlyweb.filters']
     search_query = get_search_query(environ)
@@ -203,6 +338,66 @@ def whoosher_search(environ, start_response):
     return send_tiddlers(environ, start_response, tiddlers=candidate_tiddlers)
 
 
+def whoosher_batch_search(environ, start_response):
+    """
+    Handle incoming /search/batch?q=<query>&q=<query> and
+    return, as JSON, the readable tiddlers found for each
+    query.
+    """
+    store = environ['tiddlyweb.store']
+    usersign = environ['tiddlyweb.usersign']
+    config = environ['tiddlyweb.config']
+    start_warm_up(config)
+    queries = environ['tiddlyweb.query'].get('q', [])
+    if not queries:
+        raise HTTP400('query string required')
+    batch_limit = config.get('wsearch.batch_limit',
+            SEARCH_DEFAULTS['wsearch.batch_limit'])
+    if len(queries) > batch_limit:
+        raise HTTP400('too many queries, at most %s allowed' % batch_limit)
+
+    try:
+        try:
+            all_results = search_many(config, queries)
+        except QueryParserError as exc:
+            raise HTTP400('malformed query string: %s' % exc)
+        except QueryError as exc:
+            raise HTTP400('unsupported query: %s' % exc)
+
+        output = []
+        for query, results in zip(queries, all_results):
+            tiddlers = []
+            for result in results:
+                bag, title = result['id'].split(':', 1)
+                tiddlers.append(Tiddler(title, bag))
+            output.append({'query': query,
+                'tiddlers': [{'bag': tiddler.bag, 'title': tiddler.title}
+                    for tiddler in readable_tiddlers_by_bag(store, tiddlers,
+                        usersign)]})
+
+    except StoreMethodNotImplemented:
+        raise HTTP400('Search system not implemented')
+    except StoreError as exc:
+        raise HTTP400('Error while processing search: %s' % exc)
+
+    start_response('200 OK', [
+        ('Content-Type', 'application/json; charset=UTF-8')])
+    return [simplejson.dumps(output).encode('UTF-8')]
+
+
+def whoosher_ready(environ, start_response):
+    """
+    Respond 200 if the index has been warmed up, otherwise 503.
+    """
+    start_warm_up(environ['tiddlyweb.config'])
+    if READINESS['ready']:
+        status, body = '200 OK', 'ready'
+    else:
+        status, body = '503 Service Unavailable', 'warming up'
+    start_response(status, [('Content-Type', 'text/plain; charset=UTF-8')])
+    return [body.encode('UTF-8')]
+
+
 def whoosh_search(environ):
     """
     Handle incoming /search?q=<query> and
@@ -213,6 +408,8 @@ def whoosh_search(environ):
         results = search(environ['tiddlyweb.config'], search_query)
     except QueryParserError as exc:
         raise HTTP400('malformed query string: %s' % exc)
+    except QueryError as exc:
+        raise HTTP400('unsupported query: %s' % exc)
     tiddlers = []
     for result in results:
         bag, title = result['id'].split(':', 1)
@@ -228,10 +425,7 @@ def get_index(config):
     If there isn't one in the dir, create one. If there is
     not dir, create the dir.
     """
-    index_dir = config.get('wsearch.indexdir',
-            SEARCH_DEFAULTS['wsearch.indexdir'])
-    if not os.path.isabs(index_dir):
-        index_dir = os.path.join(config.get('root_dir', ''), index_dir)
+    index_dir = _index_dir(config)
 
     if exists_in(index_dir):
         # For now don't trap exceptions, as we don't know what they
@@ -242,12 +436,33 @@ def get_index(config):
             os.mkdir(index_dir)
         except OSError:
             pass
-        schema = config.get('wsearch.schema',
-                SEARCH_DEFAULTS['wsearch.schema'])
+        schema = get_schema(config)
         index = create_in(index_dir, Schema(**schema))
     return index
 
 
+def get_schema(config):
+    """
+    Return the schema dict described by config: wsearch.schema
+    if it is set, otherwise the schema of wsearch.profile, falling
+    back to the default schema.
+    """
+    schema = config.get('wsearch.schema')
+    if schema:
+        return schema
+    profile = config.get('wsearch.profile',
+            SEARCH_DEFAULTS['wsearch.profile'])
+    if profile:
+        try:
+            return SEARCH_PROFILES[profile]
+        except KeyError:
+            message = ('unknown wsearch.profile %r, choose one of: %s'
+                    % (profile, ', '.join(sorted(SEARCH_PROFILES))))
+            LOGGER.error('whoosher: %s', message)
+            raise ValueError(message)
+    return SEARCH_DEFAULTS['wsearch.schema']
+
+
 def get_writer(config):
     """
     Return a writer based on config insructions.
@@ -276,15 +491,16 @@ def get_searcher(config):
 
 
 def get_parser(config):
-    schema = config.get('wsearch.schema', SEARCH_DEFAULTS['wsearch.schema'])
+    schema = get_schema(config)
     default_fields = config.get('wsearch.default_fields',
             SEARCH_DEFAULTS['wsearch.default_fields'])
     return MultifieldParser(default_fields, schema=Schema(**schema))
 
 
-def query_parse(config, query):
-    parser = get_parser(config)
-    parser.add_plugin(FieldAliasPlugin({"tags": ["tag"]}))
+def query_parse(config, query, parser=None):
+    if parser is None:
+        parser = get_parser(config)
+        parser.add_plugin(FieldAliasPlugin({"tags": ["tag"]}))
     return parser.parse(query)
 
 
@@ -301,6 +517,64 @@ def search(config, query):
     return results
 
 
+def search_many(config, queries):
+    """
+    Perform several searches with one parser and one
+    searcher, returning a list of whoosh result sets in
+    the order of queries. All the results come from the
+    same generation of the index.
+    """
+    limit = config.get('wsearch.results_limit', 51)
+    parser = get_parser(config)
+    parser.add_plugin(FieldAliasPlugin({"tags": ["tag"]}))
+    searcher = get_searcher(config)
+    all_results = []
+    for query in queries:
+        query = query_parse(config, unicode(query), parser)
+        LOGGER.debug('whoosher: query parsed to %s', query)
+        all_results.append(searcher.search(query, limit=limit))
+    return all_results
+
+
+def start_warm_up(config):
+    """
+    If wsearch.warmup is set and this process has not yet
+    started warming up, run warm_up in a background thread.
+    A process forked from one that has started is detected
+    by its different process id, and starts its own warm-up.
+    """
+    queries = config.get('wsearch.warmup', SEARCH_DEFAULTS['wsearch.warmup'])
+    if queries is None or READINESS['pid'] == os.getpid():
+        return
+    with WARMUP_LOCK:
+        if READINESS['pid'] == os.getpid():
+            return
+        READINESS['pid'] = os.getpid()
+        READINESS['ready'] = False
+        thread = threading.Thread(target=warm_up, args=(config, queries))
+        thread.daemon = True
+        thread.start()
+
+
+def warm_up(config, queries):
+    """
+    Run queries so that the index files are in the operating
+    system's page cache and the query analyzer caches are
+    filled. Each search opens the index anew, so nothing else
+    is kept for later searches. Marks the process ready when
+    done, even on error.
+    """
+    LOGGER.debug('whoosher: warming up index')
+    try:
+        for results in search_many(config, queries):
+            len(results)
+    except:
+        LOGGER.error('whoosher: exception while warming up: %s',
+                format_exc())
+    READINESS['ready'] = True
+    LOGGER.debug('whoosher: index warmed up')
+
+
 def delete_tiddler(tiddler, writer):
     """
     Delete the named tiddler from the index.
@@ -310,18 +584,74 @@ def delete_tiddler(tiddler, writer):
     writer.delete_by_term('id', _tiddler_id(tiddler))
 
 
-def index_tiddler(tiddler, schema, writer):
+def delete_bag(bag_name, writer):
+    """
+    Delete every tiddler in the named bag from the index.
+
+    This requires the bagid field in the schema of the index,
+    without it an error is logged and nothing is deleted.
+    """
+    if 'bagid' not in writer.schema:
+        LOGGER.error('whoosher: index has no bagid field, unable to '
+                'delete bag %s, add bagid to a custom wsearch.schema, '
+                'remove the index and reindex', bag_name)
+        return
+    LOGGER.debug('whoosher: deleting bag: %s', bag_name)
+    writer.delete_by_term('bagid', unicode(bag_name))
+
+
+def index_bag(config, store, bag, prefix=None, old_name=None):
+    """
+    Index the tiddlers in bag with a single writer and commit.
+
+    If prefix is set only tiddlers whose title starts with prefix
+    are indexed. If old_name is set, the documents of the bag of
+    that name are removed in the same commit, for when a bag has
+    been renamed.
+    """
+    schema = get_schema(config)
+    limits = config.get('wsearch.field_limits',
+            SEARCH_DEFAULTS['wsearch.field_limits'])
+    writer = get_writer(config)
+    if writer:
+        try:
+            if old_name:
+                delete_bag(old_name, writer)
+            try:
+                tiddlers = bag.get_tiddlers()
+            except AttributeError:
+                tiddlers = store.list_bag_tiddlers(bag)
+            for tiddler in tiddlers:
+                if prefix and not tiddler.title.startswith(prefix):
+                    continue
+                tiddler = store.get(tiddler)
+                index_tiddler(tiddler, schema, writer, limits)
+            writer.commit()
+        except:
+            LOGGER.debug('whoosher: exception while indexing: %s',
+                    format_exc())
+            writer.cancel()
+    else:
+        LOGGER.debug('whoosher: unable to get writer '
+                '(locked) for %s', bag.name)
+
+
+def index_tiddler(tiddler, schema, writer, limits=None):
     """
     Index the given tiddler with the given schema using
     the provided writer.
 
     The schema dict is read to find attributes and fields
-    on the tiddler.
+    on the tiddler. If limits is provided it is a dict of
+    field names to the maximum number of characters of that
+    field to index.
     """
     if binary_tiddler(tiddler):
         return
     LOGGER.debug('whoosher: indexing tiddler: %s:%s', tiddler.bag,
             tiddler.title)
+    limits = limits or {}
+    truncated = skipped = False
     data = {}
     for key in schema:
         try:
@@ -329,26 +659,67 @@ def index_tiddler(tiddler, schema, writer):
                 value = getattr(tiddler, key)
             except AttributeError:
                 value = tiddler.fields[key]
-            try:
-                data[key] = unicode(value.lower())
-            except AttributeError:
+            if not hasattr(value, 'lower'):
                 value = ','.join(value)
-                data[key] = unicode(value.lower())
+            if _binaryish(value):
+                LOGGER.debug('whoosher: skipping binary field %s on %s:%s',
+                        key, tiddler.bag, tiddler.title)
+                skipped = True
+                continue
+            limit = limits.get(key)
+            if limit and len(value) > limit:
+                # slice before lowering so only the indexed part is copied
+                value = value[:limit]
+                truncated = True
+            data[key] = unicode(value.lower())
         except (KeyError, TypeError) as exc:
             pass
         except UnicodeDecodeError as exc:
             pass
+    if truncated:
+        INDEX_STATS['truncated'] += 1
+    if skipped:
+        INDEX_STATS['skipped'] += 1
+    if truncated or skipped:
+        LOGGER.info('whoosher: limited tiddler %s:%s, %s truncated and '
+                '%s with skipped fields in this process', tiddler.bag,
+                tiddler.title, INDEX_STATS['truncated'],
+                INDEX_STATS['skipped'])
     data['id'] = _tiddler_id(tiddler)
+    # indexes made before bagid was added to the schema do not have it
+    if 'bagid' in writer.schema:
+        data['bagid'] = unicode(tiddler.bag)
     writer.update_document(**data)
 
 
+def _binaryish(value):
+    """
+    Cheaply guess if value is binary by looking for NUL
+    in its first BINARY_SAMPLE characters.
+    """
+    return u'\x00' in value[:BINARY_SAMPLE]
+
+
+def _index_dir(config):
+    """
+    Return the path to the index directory, relative to
+    the instance root_dir if wsearch.indexdir is relative.
+    """
+    index_dir = config.get('wsearch.indexdir',
+            SEARCH_DEFAULTS['wsearch.indexdir'])
+    if not os.path.isabs(index_dir):
+        index_dir = os.path.join(config.get('root_dir', ''), index_dir)
+    return index_dir
+
+
 def _tiddler_id(tiddler):
     return u'%s:%s' % (tiddler.bag, tiddler.title)
 
 
 def _tiddler_change_handler(storage, tiddler):
-    schema = storage.environ['tiddlyweb.config'].get('wsearch.schema',
-            SEARCH_DEFAULTS['wsearch.schema'])
+    schema = get_schema(storage.environ['tiddlyweb.config'])
+    limits = storage.environ['tiddlyweb.config'].get('wsearch.field_limits',
+            SEARCH_DEFAULTS['wsearch.field_limits'])
     writer = get_writer(storage.environ['tiddlyweb.config'])
     store = storage.environ.get('tiddlyweb.store',
             get_store(storage.environ['tiddlyweb.config']))
@@ -356,7 +727,7 @@ def _tiddler_change_handler(storage, tiddler):
         try:
             try:
                 store.get(Tiddler(tiddler.title, tiddler.bag))
-                index_tiddler(tiddler, schema, writer)
+                index_tiddler(tiddler, schema, writer, limits)
             except NoTiddlerError:
                 delete_tiddler(tiddler, writer)
             writer.commit()
@@ -369,6 +740,21 @@ def _tiddler_change_handler(storage, tiddler):
                 tiddler.bag, tiddler.title)
 
 
+def _bag_delete_handler(storage, bag):
+    writer = get_writer(storage.environ['tiddlyweb.config'])
+    if writer:
+        try:
+            delete_bag(bag.name, writer)
+            writer.commit()
+        except:
+            LOGGER.debug('whoosher: exception while deleting bag: %s',
+                    format_exc())
+            writer.cancel()
+    else:
+        LOGGER.debug('whoosher: unable to get writer (locked) for %s',
+                bag.name)
+
+
 def _reindex_async(config):
     from tiddlywebplugins.dispatcher.listener import (DEFAULT_BEANSTALK_HOST,
             DEFAULT_BEANSTALK_PORT, BODY_SEPARATOR)
@@ -411,15 +797,16 @@ try:
             if not self.STORE:
                 self.STORE = get_store(config)
             info = self._unpack(job)
-            schema = config.get('wsearch.schema',
-                    SEARCH_DEFAULTS['wsearch.schema'])
+            schema = get_schema(config)
+            limits = config.get('wsearch.field_limits',
+                    SEARCH_DEFAULTS['wsearch.field_limits'])
             tiddler = Tiddler(info['tiddler'], info['bag'])
             writer = get_writer(config)
             if writer:
                 try:
                     try:
                         tiddler = self.STORE.get(tiddler)
-                        index_tiddler(tiddler, schema, writer)
+                        index_tiddler(tiddler, schema, writer, limits)
                     except NoTiddlerError:
                         delete_tiddler(tiddler, writer)
                     writer.commit()